@@ -1,124 +1,201 @@
-import asyncio, aiohttp, pandas as pd, ssl, urllib.parse, re, time, argparse
-from bs4 import BeautifulSoup
+import asyncio, aiohttp, csv, itertools, pandas as pd, shelve, socket, ssl, urllib.parse, re, time, argparse
+from collections import defaultdict
+from selectolax.parser import HTMLParser
 from typing import List, Callable, Awaitable
 
+from crawler_fast import (
+    ALLOWED_EXTERNALS, normalize_netloc, is_allowed_external,
+    _parse_robots, _match_robots,
+)
+
 TIMEOUT = aiohttp.ClientTimeout(total=25)
+FIELDS = [
+    "URL", "Status", "Robots Policy", "Title", "Meta Description",
+    "H1", "Wörter", "CMS", "Broken Links",
+]
+MAX_BYTES = 4 * 1024 * 1024  # Antworten über 4 MB werden abgeschnitten
+PER_HOST_LIMIT = 4  # gleichzeitige Seiten-Fetches pro Host
 UNSAFE_SSL = ssl.create_default_context()
 UNSAFE_SSL.check_hostname = False
 UNSAFE_SSL.verify_mode = ssl.CERT_NONE
 
-# Erlaubte externe Domains zusätzlich zu internen (inkl. Subdomains)
-ALLOWED_EXTERNALS = {
-    "berendsohn-digitalservice.de",
-    "berendsohn-digital.de",
-}
-
-# Helper zum Normieren der Domain (www. ignorieren)
-def normalize_netloc(netloc: str) -> str:
-    netloc = netloc.lower()
-    if netloc.startswith("www."):
-        return netloc[4:]
-    return netloc
-
-def is_allowed_external(link_norm: str, base_norm: str) -> bool:
-    if link_norm == base_norm:
-        return True
-    for allowed in ALLOWED_EXTERNALS:
-        if link_norm == allowed or link_norm.endswith("." + allowed):
-            return True
-    return False
-
-def strip_html_for_wc(html: str) -> str:
-    soup = BeautifulSoup(html, "lxml")
-    if soup.head:
-        soup.head.decompose()
-    for t in soup(["script", "style", "noscript", "template"]):
+class AdmissionController:
+    """Zulassung über Condition + Zähler statt Semaphore.
+
+    Ein Semaphore lässt sich zur Laufzeit nicht sicher verkleinern; hier
+    kann set_limit() die effektive Parallelität jederzeit anpassen, z. B.
+    zum Drosseln nach HTTP 429."""
+
+    def __init__(self, limit: int):
+        self._active = 0
+        self._limit = max(1, limit)
+        self._cond = asyncio.Condition()
+
+    @property
+    def limit(self) -> int:
+        return self._limit
+
+    async def acquire(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self._active < self._limit)
+            self._active += 1
+
+    async def release(self):
+        async with self._cond:
+            self._active -= 1
+            self._cond.notify(1)
+
+    async def set_limit(self, new_limit: int):
+        async with self._cond:
+            self._limit = max(1, new_limit)
+            self._cond.notify_all()
+
+class NoDelayConnector(aiohttp.TCPConnector):
+    """TCPConnector, der TCP_NODELAY defensiv selbst setzt.
+
+    aiohttp aktiviert NODELAY auf aktuellen Versionen ohnehin, aber für die
+    vielen kleinen Requests (Linkchecks, robots.txt) darf Nagle auf keinem
+    Kernel dazwischenfunken."""
+
+    async def _wrap_create_connection(self, *args, **kwargs):
+        transport, proto = await super()._wrap_create_connection(*args, **kwargs)
+        sock = transport.get_extra_info("socket")
+        if sock is not None:
+            try:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            except OSError:
+                pass
+        return transport, proto
+
+# Einmal kompilierte Muster für die heißen Pfade
+_WS_RE = re.compile(r"\s+")
+_CMS_RE = re.compile(
+    r"(wp-content|wp-includes)|(/administrator/)|(/sites/default/)"
+    r"|(/typo3conf/)|(cdn\.shopify\.com)",
+    re.I,
+)
+_CMS_NAMES = ("WordPress", "Joomla", "Drupal", "TYPO3", "Shopify")
+
+def word_count(tree: HTMLParser) -> int:
+    if tree.head is not None:
+        tree.head.decompose()
+    for t in tree.css("script,style,noscript,template"):
         t.decompose()
-    return re.sub(r"\s+", " ", soup.get_text(" ")).strip()
-
-def word_count(html: str) -> int:
-    return len(strip_html_for_wc(html).split())
-
-def detect_cms(html: str, headers, url: str) -> str:
-    soup = BeautifulSoup(html, "lxml")
-    gen = soup.find("meta", attrs={"name": "generator"})
-    if gen and gen.get("content"):
-        return gen["content"].split()[0]
-    for pat, name in [
-        ("wp-content|wp-includes", "WordPress"),
-        ("/administrator/", "Joomla"),
-        ("/sites/default/", "Drupal"),
-        ("/typo3conf/", "TYPO3"),
-        ("cdn.shopify.com", "Shopify"),
-    ]:
-        if re.search(pat, html, re.I) or re.search(pat, url, re.I):
-            return name
-    return "Unbekannt"
-
-def parse_page(html: str):
-    soup = BeautifulSoup(html, "lxml")
-    title = soup.title.string.strip() if soup.title and soup.title.string else ""
-    meta = soup.find("meta", attrs={"name": "description"})
-    meta_desc = meta.get("content", "").strip() if meta else ""
-    h1 = soup.find("h1")
-    h1_txt = h1.get_text(separator=" ", strip=True) if h1 else ""
-    wc = word_count(html)
-    return title, meta_desc, h1_txt, wc
-
-async def fetch(session: aiohttp.ClientSession, url: str, retries=3):
+    body = tree.body
+    if body is None:
+        return 0
+    # Zählen direkt über die Textknoten, ohne den bereinigten Text zu materialisieren
+    return sum(
+        len(node.text_content.split())
+        for node in body.traverse(include_text=True)
+        if node.tag == "-text"
+    )
+
+def _extract_all(tree: HTMLParser, html: str, headers, url: str) -> dict:
+    """Titel, Metas, H1, Indexierbarkeit, CMS und Wortzahl in einem
+    Baumdurchlauf statt einer Selector-Runde pro Helfer."""
+    title = h1 = None
+    metas: dict = {}
+    for node in tree.root.traverse():
+        tag = node.tag
+        if tag == "meta":
+            name = (node.attributes.get("name") or "").lower()
+            if name in ("description", "robots", "generator") and name not in metas:
+                metas[name] = node.attributes.get("content") or ""
+        elif tag == "title":
+            if title is None:
+                title = node.text(deep=True).strip()
+        elif tag == "h1":
+            if h1 is None:
+                h1 = _WS_RE.sub(" ", node.text(deep=True, separator=" ")).strip()
+
+    if "X-Robots-Tag" in headers and "noindex" in headers["X-Robots-Tag"].lower():
+        seo_status = "NOINDEX via Header"
+    elif "noindex" in metas.get("robots", "").lower():
+        seo_status = "NOINDEX via Meta"
+    else:
+        seo_status = "Indexable"
+
+    gen = metas.get("generator", "").strip()
+    if gen:
+        cms = gen.split()[0]
+    else:
+        # Ein Scan über das rohe HTML statt fünf einzelner Muster
+        m = _CMS_RE.search(html) or _CMS_RE.search(url)
+        cms = _CMS_NAMES[m.lastindex - 1] if m else "Unbekannt"
+
+    return {
+        "Status": seo_status,
+        "Title": title or "",
+        "Meta Description": metas.get("description", "").strip(),
+        "H1": h1 or "",
+        # word_count zuletzt: entfernt head/script/style aus dem Baum
+        "Wörter": word_count(tree),
+        "CMS": cms,
+    }
+
+async def fetch(session: aiohttp.ClientSession, url: str, retries=3, headers=None):
     last_exc = None
     for attempt in range(retries):
         try:
-            async with session.get(url, allow_redirects=True) as r:
-                text = await r.text()
+            async with session.get(url, allow_redirects=True, headers=headers) as r:
+                ctype = r.headers.get("Content-Type", "")
+                # Binärantworten (Bilder, PDFs, ...) gar nicht erst lesen;
+                # text/plain bleibt erlaubt (robots.txt)
+                if ctype and not ctype.startswith("text/"):
+                    return r.status, "", r.headers
+                raw = await r.content.read(MAX_BYTES)
+                # expliziter Charset-Fallback statt chardet-Scan über den Body
+                text = raw.decode(r.charset or "utf-8", errors="replace")
                 return r.status, text, r.headers
         except Exception as e:
             last_exc = e
             await asyncio.sleep(1.5 * (attempt + 1))
     raise last_exc
 
-async def check_robots(session, page_url):
+async def _load_robots(session, scheme: str, netloc: str, robots_cache: dict):
+    """Liefert (allow, dis) oder einen Fehlerstatus-String, gecacht pro Host.
+
+    Der Cache lebt pro crawl()-Lauf (siehe dort); Futures fangen parallele
+    Misses auf denselben Host ab."""
+    key = f"{scheme}://{netloc}"
+    fut = robots_cache.get(key)
+    if fut is None:
+        fut = asyncio.get_running_loop().create_future()
+        robots_cache[key] = fut
+        result = "robots.txt error"
+        try:
+            _, txt, _ = await fetch(session, f"{key}/robots.txt", retries=2)
+        except Exception:
+            pass
+        else:
+            if txt.lower().startswith("404"):
+                result = "robots.txt not found"
+            else:
+                result = _parse_robots(txt)
+        finally:
+            # auch bei Cancellation auflösen, sonst hängen spätere Wartende
+            # ewig an einem nie fertigen Future
+            if not fut.done():
+                fut.set_result(result)
+    return await fut
+
+async def check_robots(session, page_url, robots_cache=None):
     p = urllib.parse.urlparse(page_url)
-    robots_url = f"{p.scheme}://{p.netloc}/robots.txt"
-    try:
-        _, txt, _ = await fetch(session, robots_url, retries=2)
-    except Exception:
-        return "robots.txt error"
-    if txt.lower().startswith("404"):
-        return "robots.txt not found"
-
-    ua, allow, dis = False, [], []
-    for line in txt.splitlines():
-        line = line.strip()
-        if not line or line.startswith("#"):
-            continue
-        if line.lower().startswith("user-agent"):
-            ua = "*" in line.split(":", 1)[1]
-            continue
-        if not ua:
-            continue
-        d, _, val = line.partition(":")
-        d, val = d.lower().strip(), val.strip()
-        if d == "disallow" and val:
-            dis.append(val)
-        elif d == "allow":
-            allow.append(val)
-
-    path = urllib.parse.unquote(p.path or "/")
-    best_a = max((x for x in allow if path.startswith(x)), default="", key=len)
-    best_d = max((x for x in dis if path.startswith(x)), default="", key=len)
-    return "Allowed" if len(best_a) >= len(best_d) else "Disallowed"
-
-def check_noindex(html: str, headers) -> str:
-    if "X-Robots-Tag" in headers and "noindex" in headers["X-Robots-Tag"].lower():
-        return "NOINDEX via Header"
-    soup = BeautifulSoup(html, "lxml")
-    meta = soup.find("meta", attrs={"name": "robots"})
-    if meta and "noindex" in (meta.get("content") or "").lower():
-        return "NOINDEX via Meta"
-    return "Indexable"
-
-async def check_link(session, link):
+    rules = await _load_robots(
+        session, p.scheme, p.netloc,
+        robots_cache if robots_cache is not None else {},
+    )
+    if isinstance(rules, str):
+        return rules
+    return _match_robots(rules, urllib.parse.unquote(p.path or "/"))
+
+async def check_link(session, link, link_sem=None, link_cache=None):
+    # link_cache stellt sicher, dass jede URL pro crawl()-Lauf höchstens
+    # einmal geprüft wird; der Cache lebt wie link_sem nur einen Lauf lang
+    if link_cache is not None and link in link_cache:
+        return link_cache[link]
+
     headers = {
         "User-Agent": (
             "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
@@ -127,32 +204,36 @@ async def check_link(session, link):
         )
     }
 
-    try:
-        async with session.head(link, allow_redirects=True, timeout=10, headers=headers) as resp:
-            if 200 <= resp.status < 400 or resp.status == 429:
-                return None
-            else:
-                return link
-    except Exception:
-        # Fallback auf GET
+    if link_sem is None:
+        link_sem = asyncio.Semaphore(1)
+
+    # Ein GET mit Range: bytes=0-0 statt HEAD + GET-Fallback: Server, die
+    # HEAD nicht mögen, kosten so keinen zweiten Round-Trip, und der Body
+    # wird nie gelesen
+    headers["Range"] = "bytes=0-0"
+    async with link_sem:
         try:
             async with session.get(link, allow_redirects=True, timeout=10, headers=headers) as resp:
                 if 200 <= resp.status < 400 or resp.status == 429:
-                    return None
+                    result = None
                 else:
-                    return link
+                    result = link
         except Exception:
-            return link
+            result = link
+
+    if link_cache is not None:
+        link_cache[link] = result
+    return result
 
-async def find_broken_links(html: str, base_url: str, session) -> str:
-    soup = BeautifulSoup(html, "lxml")
+async def find_broken_links(tree: HTMLParser, base_url: str, session,
+                            link_sem=None, link_cache=None) -> str:
     links_with_text = {}
 
     base_parsed = urllib.parse.urlparse(base_url)
     base_norm = normalize_netloc(base_parsed.netloc)
 
-    for tag in soup.find_all("a", href=True):
-        href = tag.get("href")
+    for tag in tree.css("a[href]"):
+        href = tag.attributes.get("href")
         if not href:
             continue
         if href.startswith("mailto:") or href.startswith("tel:") or href.startswith("#"):
@@ -166,14 +247,14 @@ async def find_broken_links(html: str, base_url: str, session) -> str:
         if not is_allowed_external(link_norm, base_norm):
             continue
 
-        anchor = tag.get_text(strip=True)
+        anchor = _WS_RE.sub(" ", tag.text(deep=True, separator=" ")).strip()
         links_with_text[full_link] = anchor
 
     if not links_with_text:
-        return 0
+        return ""
 
-    # parallele Prüfung
-    tasks = [check_link(session, link) for link in links_with_text]
+    # parallele Prüfung, global gedrosselt über link_sem
+    tasks = [check_link(session, link, link_sem, link_cache) for link in links_with_text]
     results = await asyncio.gather(*tasks)
 
     broken = []
@@ -183,48 +264,165 @@ async def find_broken_links(html: str, base_url: str, session) -> str:
             broken.append(f"{link} (Text: {anchor_display})")
 
     if not broken:
-        return 0
+        return ""
     return ", ".join(broken)
 
-async def worker(url: str, session, sem, progress_cb=None):
+async def _process(url: str, session, progress_cb=None, link_sem=None, cache=None,
+                   admission=None, host_sems=None, robots_cache=None,
+                   link_cache=None):
     if not url.startswith(("http://", "https://")):
         url = "https://" + url
-    async with sem:
-        if progress_cb:
-            progress_cb("fetch", url)
-        try:
-            status_code, html, headers = await fetch(session, url)
-        except Exception as e:
-            return {"URL": url, "Status": f"Error: {e}"}
-
-        seo_status = check_noindex(html, headers)
-        title, meta_desc, h1, wc = parse_page(html)
-        robots = await check_robots(session, url)
-        cms = detect_cms(html, headers, url)
-        broken_links = await find_broken_links(html, url, session)
-
-        return {
-            "URL": url,
-            "Status": seo_status,
-            "Robots Policy": robots,
-            "Title": title,
-            "Meta Description": meta_desc,
-            "H1": h1,
-            "Wörter": wc,
-            "CMS": cms,
-            "Broken Links": broken_links,
-        }
+    if progress_cb:
+        progress_cb("fetch", url)
+    # Bedingter GET, falls der letzte Lauf ETag/Last-Modified gesehen hat
+    entry = cache.get(url) if cache is not None else None
+    cond_headers = {}
+    if entry:
+        if entry.get("etag"):
+            cond_headers["If-None-Match"] = entry["etag"]
+        if entry.get("lm"):
+            cond_headers["If-Modified-Since"] = entry["lm"]
+    # Seite und robots.txt parallel holen, die beiden sind unabhängig;
+    # pro Host bleiben höchstens PER_HOST_LIMIT Seiten gleichzeitig offen,
+    # damit ein langsamer Host nicht die ganze Pipeline blockiert
+    host_sem = host_sems[urllib.parse.urlparse(url).netloc] if host_sems is not None else None
+    if host_sem is not None:
+        await host_sem.acquire()
+    try:
+        page, robots = await asyncio.gather(
+            fetch(session, url, headers=cond_headers or None),
+            check_robots(session, url, robots_cache),
+            return_exceptions=True,
+        )
+    finally:
+        if host_sem is not None:
+            host_sem.release()
+    if isinstance(robots, BaseException):
+        robots = "robots.txt error"
+    if isinstance(page, BaseException):
+        return {"URL": url, "Status": f"Error: {page}"}
+    status_code, html, headers = page
+
+    if status_code == 429 and admission is not None:
+        # Server drosselt uns: Parallelität halbieren
+        await admission.set_limit(admission.limit // 2)
+
+    if status_code == 304 and entry:
+        # Unverändert: komplettes Parse-Ergebnis aus dem Cache, nur die
+        # (pro Host ohnehin gecachte) Robots-Policy auffrischen
+        row = dict(entry["row"])
+        row["Robots Policy"] = robots
+        return row
+
+    # Nur ein Parse pro Seite; Links vor _extract_all einsammeln, weil
+    # die Wortzählung dort den Baum zerlegt
+    tree = HTMLParser(html)
+    broken_links = await find_broken_links(tree, url, session, link_sem, link_cache)
+    fields = _extract_all(tree, html, headers, url)
+
+    row = {
+        "URL": url,
+        "Status": fields["Status"],
+        "Robots Policy": robots,
+        "Title": fields["Title"],
+        "Meta Description": fields["Meta Description"],
+        "H1": fields["H1"],
+        "Wörter": fields["Wörter"],
+        "CMS": fields["CMS"],
+        "Broken Links": broken_links,
+    }
+    if cache is not None and status_code == 200:
+        etag = headers.get("ETag", "")
+        lm = headers.get("Last-Modified", "")
+        if etag or lm:
+            cache[url] = {"etag": etag, "lm": lm, "row": row}
+    return row
+
+def interleave_by_host(urls: List[str]) -> List[str]:
+    """Ordnet die URL-Liste round-robin über die Hosts, damit ein einzelner
+    (langsamer) Host nicht alle vorderen Queue-Plätze belegt."""
+    buckets: dict = {}
+    for u in urls:
+        buckets.setdefault(urllib.parse.urlparse(u).netloc, []).append(u)
+    if len(buckets) <= 1:
+        return list(urls)
+    return [
+        u
+        for group in itertools.zip_longest(*buckets.values())
+        for u in group
+        if u is not None
+    ]
 
 async def crawl(
     urls: List[str],
     concurrency: int = 20,
     progress_cb: Callable[[str, str], Awaitable[None]] | None = None,
-) -> pd.DataFrame:
-    connector = aiohttp.TCPConnector(limit=concurrency, ssl=UNSAFE_SSL)
-    sem = asyncio.Semaphore(concurrency)
+    on_result: Callable[[dict], None] | None = None,
+    cache_path: str | None = None,
+) -> pd.DataFrame | None:
+    """Crawlt urls; mit on_result werden fertige Zeilen sofort
+    weitergereicht statt gesammelt (Speicher O(concurrency)).
+    cache_path aktiviert einen ETag/Last-Modified-Cache über Läufe hinweg."""
+    connector = NoDelayConnector(
+        limit=concurrency,
+        limit_per_host=concurrency,
+        ssl=UNSAFE_SSL,
+        use_dns_cache=True,
+        ttl_dns_cache=300,
+        keepalive_timeout=30,
+        enable_cleanup_closed=True,
+    )
+    # Begrenzte Queue statt N vorgebauter Tasks: Speicher O(concurrency),
+    # Backpressure über maxsize
+    queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+    results = []
+    # gemeinsames Limit für alle Linkchecks, sonst reißen linkreiche
+    # Seiten das Connector-Limit
+    link_sem = asyncio.Semaphore(concurrency * 4)
+    admission = AdmissionController(concurrency)
+    host_sems = defaultdict(lambda: asyncio.Semaphore(PER_HOST_LIMIT))
+    # robots.txt pro Host nur einmal pro Lauf laden; bewusst kein Modul-Cache,
+    # damit ein langlebiger Prozess (Streamlit) keine veralteten Regeln oder
+    # einmalige Fehler über Läufe hinweg festhält
+    robots_cache: dict = {}
+    # Linkcheck-Ergebnisse ebenfalls nur für diesen Lauf merken
+    link_cache: dict = {}
+    cache = shelve.open(cache_path) if cache_path else None
+
     async with aiohttp.ClientSession(timeout=TIMEOUT, connector=connector) as sess:
-        tasks = [worker(u, sess, sem, progress_cb) for u in urls]
-        results = await asyncio.gather(*tasks)
+
+        async def _worker_loop():
+            while True:
+                url = await queue.get()
+                try:
+                    if url is None:
+                        return
+                    await admission.acquire()
+                    try:
+                        row = await _process(url, sess, progress_cb, link_sem, cache,
+                                             admission, host_sems, robots_cache,
+                                             link_cache)
+                    except Exception as e:
+                        row = {"URL": url, "Status": f"Error: {e}"}
+                    finally:
+                        await admission.release()
+                    if on_result is not None:
+                        on_result(row)
+                    else:
+                        results.append(row)
+                finally:
+                    queue.task_done()
+
+        workers = [asyncio.create_task(_worker_loop()) for _ in range(concurrency)]
+        for u in urls:
+            await queue.put(u)
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+    if cache is not None:
+        cache.close()
+    if on_result is not None:
+        return None
     return pd.DataFrame(results)
 
 if __name__ == "__main__":
@@ -232,9 +430,16 @@ if __name__ == "__main__":
     ap.add_argument("--input", required=True)
     ap.add_argument("--output", required=True)
     ap.add_argument("--concurrency", type=int, default=20, help="gleichzeitige Requests")
+    ap.add_argument("--cache", default=None, help="Pfad für den ETag/Last-Modified-Cache")
     args = ap.parse_args()
 
     urls = [u.strip() for u in open(args.input).read().splitlines() if u.strip()]
-    df = asyncio.run(crawl(urls, concurrency=args.concurrency))
-    df.to_csv(args.output, index=False)
-    print(df.head())
+    # CSV direkt streamen: kein DataFrame, keine Zeilen im Speicher
+    with open(args.output, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS, restval="")
+        writer.writeheader()
+        asyncio.run(crawl(
+            urls, concurrency=args.concurrency,
+            on_result=writer.writerow, cache_path=args.cache,
+        ))
+    print(f"{len(urls)} URLs analysiert -> {args.output}")
@@ -1,6 +1,7 @@
 
 import aiohttp
 import asyncio
+import functools
 from bs4 import BeautifulSoup
 from urllib.parse import urljoin, urldefrag, urlparse
 
@@ -20,11 +21,18 @@ def strip_www(hostname: str) -> str:
 def is_valid_link(href: str) -> bool:
     return not any(href.startswith(proto) for proto in ("mailto:", "tel:", "javascript:"))
 
-async def resolve_redirect(url):
+@functools.lru_cache(maxsize=200_000)
+def _normalize_link(base: str, href: str) -> tuple:
+    """Auflösen + Normieren eines Links, memoisiert: dieselben hrefs tauchen
+    auf hunderten Seiten derselben Domain immer wieder auf."""
+    full_url = urldefrag(urljoin(base, href))[0].rstrip("/")
+    netloc = urlparse(full_url).netloc
+    return full_url, netloc[4:] if netloc[:4] == "www." else netloc
+
+async def resolve_redirect(session, url):
     try:
-        async with aiohttp.ClientSession(headers=HEADERS) as session:
-            async with session.get(url, timeout=10, allow_redirects=True, ssl=False) as resp:
-                return str(resp.url)
+        async with session.get(url, timeout=10, allow_redirects=True, ssl=False) as resp:
+            return str(resp.url)
     except Exception:
         return url
 
@@ -36,38 +44,56 @@ async def fetch(session, url):
     except Exception:
         return None
 
-async def crawl_domain(start_input, max_urls=100):
+async def crawl_domain(start_input, max_urls=100, concurrency=10):
     original_start = normalize_domain(start_input)
-    start_url = await resolve_redirect(original_start)
-    parsed_start = urlparse(start_url)
-    base_netloc = strip_www(parsed_start.netloc)
-    exact_netloc = parsed_start.netloc
-    domain_root = f"{parsed_start.scheme}://{parsed_start.netloc}"
-    visited = set()
-    to_visit = {domain_root}
-    all_internal_urls = set()
 
-    conn = aiohttp.TCPConnector(limit_per_host=10)
+    # Eine Session für Redirect-Auflösung und alle Fetches (Connection-Reuse)
+    conn = aiohttp.TCPConnector(
+        limit_per_host=concurrency,
+        ttl_dns_cache=300,
+        keepalive_timeout=30,
+        enable_cleanup_closed=True,
+    )
     async with aiohttp.ClientSession(headers=HEADERS, connector=conn) as session:
-        while to_visit and len(visited) < max_urls:
-            url = to_visit.pop()
-            if url in visited:
-                continue
-            visited.add(url)
-            html = await fetch(session, url)
-            if not html:
-                continue
-            parsed_url = urlparse(url)
-            if parsed_url.netloc == exact_netloc:
-                all_internal_urls.add(url)
-            soup = BeautifulSoup(html, "lxml")
-            for tag in soup.find_all("a", href=True):
-                href = tag.get("href")
-                if not is_valid_link(href):
-                    continue
-                full_url = urljoin(url, href)
-                full_url = urldefrag(full_url)[0].rstrip("/")
-                parsed = urlparse(full_url)
-                if strip_www(parsed.netloc) == base_netloc and full_url not in visited and len(visited) + len(to_visit) < max_urls:
-                    to_visit.add(full_url)
+        start_url = await resolve_redirect(session, original_start)
+        parsed_start = urlparse(start_url)
+        base_netloc = strip_www(parsed_start.netloc)
+        exact_netloc = parsed_start.netloc
+        domain_root = f"{parsed_start.scheme}://{parsed_start.netloc}"
+
+        # Geordnete FIFO-Frontier (BFS) statt set.pop(); seen deckelt die
+        # Gesamtmenge der eingereihten URLs auf max_urls
+        frontier: asyncio.Queue = asyncio.Queue()
+        frontier.put_nowait(domain_root)
+        seen = {domain_root}
+        all_internal_urls = set()
+
+        async def _spider_worker():
+            while True:
+                url = await frontier.get()
+                try:
+                    html = await fetch(session, url)
+                    if not html:
+                        continue
+                    if urlparse(url).netloc == exact_netloc:
+                        all_internal_urls.add(url)
+                    soup = BeautifulSoup(html, "lxml")
+                    for tag in soup.find_all("a", href=True):
+                        href = tag.get("href")
+                        if not is_valid_link(href):
+                            continue
+                        full_url, link_netloc = _normalize_link(url, href)
+                        if link_netloc == base_netloc and full_url not in seen and len(seen) < max_urls:
+                            seen.add(full_url)
+                            frontier.put_nowait(full_url)
+                except Exception:
+                    pass
+                finally:
+                    frontier.task_done()
+
+        workers = [asyncio.create_task(_spider_worker()) for _ in range(concurrency)]
+        await frontier.join()
+        for w in workers:
+            w.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
     return sorted(all_internal_urls)
@@ -2,116 +2,25 @@
 import streamlit as st
 import asyncio
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.ipc as ipc
 import io
 import datetime
-from pandas import ExcelWriter
-from crawler_async import crawl
+import queue
+from concurrent.futures import ThreadPoolExecutor
+import xlsxwriter
+from crawler_async import crawl, interleave_by_host, FIELDS
 from sitemap_loader import load_sitemap
 from crawler_spider import crawl_domain
 
 LOGO_URL_LARGE = "https://www.berendsohn.de/logos/bag-logo.svg"
 LOGO_URL_SMALL = "https://www.berendsohn.de/logos/bag-logo.svg"
 
-st.logo(
-    LOGO_URL_LARGE,
-    icon_image=LOGO_URL_SMALL,
-)
-
-today_str = datetime.date.today().strftime("%Y%m%d")
-
-st.set_page_config(page_title="SEO-Checker", layout="wide")
-st.title("SEO-Checker")
-st.text("Prüfe jetzt eine URL, um wertvolle Einblicke in die wichtigsten SEO-Metriken zu erhalten.")
-
-if "url_list" not in st.session_state:
-    st.session_state["url_list"] = []
-if "result_df" not in st.session_state:
-    st.session_state["result_df"] = None
-
-tab_crawler, tab_manual, tab_sitemap = st.tabs(["Crawler", "Manuelle Eingabe", "Sitemap laden"])
-
-with tab_crawler:
-    crawl_url = st.text_input("Start-URL zum Crawlen", placeholder="https://example.com")
-    max_pages = st.slider("Max. Anzahl zu crawlender Seiten", 10, 500, 100)
-    if st.button("Domain crawlen"):
-        if crawl_url:
-            with st.spinner("Crawle interne Seiten …"):
-                st.session_state["url_list"] = asyncio.run(crawl_domain(crawl_url, max_pages))
-            st.success(f"{len(st.session_state['url_list'])} interne Seiten gefunden.")
-
-with tab_manual:
-    textarea = st.text_area("Eine URL pro Zeile")
-    if st.button("URLs übernehmen"):
-        urls = [u.strip() for u in textarea.splitlines() if u.strip()]
-        st.session_state["url_list"] = urls
-        st.success(f"{len(urls)} URLs übernommen.")
-
-with tab_sitemap:
-    sitemap_url = st.text_input("Sitemap-URL", placeholder="https://example.com/sitemap.xml")
-    if st.button("Sitemap laden"):
-        if sitemap_url:
-            with st.spinner("Sitemap wird geladen …"):
-                st.session_state["url_list"] = load_sitemap(sitemap_url)
-            st.success(f"{len(st.session_state['url_list'])} URLs gefunden.")
-
-st.divider()
-
-if st.session_state["url_list"]:
-    if st.button("Analyse starten"):
-        progress = st.progress(0, "Starte Analyse …")
-        async def run_crawl(urls):
-            df_all = []
-            for idx, url in enumerate(urls, 1):
-                df_all.append(await crawl([url]))
-                progress.progress(idx / len(urls), text=f"Analysiere {idx}/{len(urls)}")
-            return pd.concat(df_all, ignore_index=True)
-
-        st.session_state["result_df"] = asyncio.run(run_crawl(st.session_state["url_list"]))
-        progress.empty()
-
-def row_style(row):
-    if str(row.get("HTTP Status", "")).startswith(("4", "5")):
-        return ["background-color: #f8d7da"] * len(row)
-    if "noindex" in str(row.get("Status", "")).lower() or row.get("Robots Policy") == "Disallowed":
-        return ["background-color: #fff4cd"] * len(row)
-    return [""] * len(row)
-
-if st.session_state["result_df"] is not None:
-    df = st.session_state["result_df"].drop(
-        columns=[c for c in ("Hinweis",) if c in st.session_state["result_df"].columns]
-    )
-
-    try:
-        styled = df.style.apply(row_style, axis=1)
-        st.dataframe(styled, use_container_width=True)
-    except AttributeError:
-        st.dataframe(df, use_container_width=True)
-
-    # CSV Export
-    csv = df.to_csv(index=False).encode()
-    st.download_button(
-        label="CSV herunterladen",
-        data=csv,
-        file_name=f"seo_checker_results_{today_str}.csv",
-        mime="text/csv"
-    )
-
-    # Excel Export
-    excel_buffer = io.BytesIO()
-    with ExcelWriter(excel_buffer, engine="xlsxwriter") as writer:
-        df.to_excel(writer, index=False, sheet_name="SEO Ergebnisse")
-    st.download_button(
-        label="Excel herunterladen",
-        data=excel_buffer.getvalue(),
-        file_name=f"seo_checker_results_{today_str}.xlsx",
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-    )
-
-    st.markdown("---")
-    st.subheader("Erklärungen der SEO-Metriken")
-
-    with st.expander("Indexierbarkeit (noindex)"):
-        st.write("""
+# Erklärungstexte einmal als Modulkonstanten, nicht pro Rerun als
+# Literale im Renderpfad
+_EXPLANATIONS = {
+    "Indexierbarkeit (noindex)": """
 **Was es ist**  
 "Indexierbarkeit" bedeutet, dass Suchmaschinen eine Webseite "lesen" und in ihren Index aufnehmen können, damit sie in den Suchergebnissen erscheinen kann.  
 **"Noindex"** ist eine Anweisung an Suchmaschinen, eine bestimmte Seite nicht zu indexieren.
@@ -127,10 +36,8 @@ Die Startseite, eine wichtige Produktseite oder Landingpage ist auf "noindex" ge
 **Gutes Beispiel**  
 Die "Danke für Ihre Anfrage"-Seite nach dem Absenden eines Kontaktformulars ist auf "noindex" gesetzt.  
 → Erklärung: Diese Seite hat nur nach einer Aktion Bedeutung und bietet sonst keinen Mehrwert für Suchende.
-""")
-
-    with st.expander("Robots-Policy (robots.txt)"):
-        st.write("""
+""",
+    "Robots-Policy (robots.txt)": """
 **Was es ist**  
 Die robots.txt ist eine kleine Datei auf Ihrem Webserver, die Suchmaschinen mitteilt, welche Bereiche Ihrer Webseite sie crawlen (besuchen und lesen) dürfen und welche nicht.  
 Mit `/disallow` verbietet man bestimmten Suchmaschinen-Bots den Zugriff auf bestimmte Verzeichnisse oder Seiten.
@@ -146,10 +53,8 @@ Die gesamte Webseite wird per robots.txt disallowiert oder wichtige Bereiche wie
 **Gutes Beispiel**  
 Das Verzeichnis mit internen Dokumenten oder Testseiten (`Disallow: /intern/` oder `Disallow: /testseite/`) wird in der robots.txt ausgeschlossen.  
 → Erklärung: Hier wird gezielt verhindert, dass nicht‑öffentliche oder redundante Inhalte von Suchmaschinen indexiert werden, was sinnvoll ist und die Effizienz des Crawlings verbessert.
-""")
-
-    with st.expander("Title (Titel-Tag)"):
-        st.write("""
+""",
+    "Title (Titel-Tag)": """
 **Was es ist**  
 Der Title ist der wichtigste Textbaustein einer Webseite für Suchmaschinen und Nutzer.  
 Er erscheint im Browser-Tab und als Überschrift in den Suchergebnissen.
@@ -166,10 +71,8 @@ Nutzer klicken darauf, um zu entscheiden, ob die Seite relevant ist.
 „SEO Beratung Hamburg – Experten für Suchmaschinenoptimierung | Ihre Agentur XYZ“  
 → Erklärung: Hier ist das wichtigste Keyword („SEO Beratung“) am Anfang, der Standort („Hamburg“) ist enthalten und der Nutzer versteht sofort, worum es geht.  
 Ziel ist es, das Fokus-Keyword möglichst weit vorn zu platzieren und einen Mehrwert für den Nutzer zu kommunizieren.
-""")
-
-    with st.expander("Meta-Description"):
-        st.write("""
+""",
+    "Meta-Description": """
 **Was es ist**  
 Das ist der kurze Textausschnitt, der unter dem Title in den Suchergebnissen angezeigt wird.  
 Er ist wie ein kleiner Werbetext für Ihre Seite.
@@ -186,10 +89,8 @@ Eine gute Beschreibung weckt Interesse.
 „Steigern Sie Ihre Sichtbarkeit online mit professioneller SEO Beratung in Hamburg.  
 Wir analysieren, optimieren und bringen Sie nach vorne! Jetzt kostenloses Erstgespräch vereinbaren.“  
 → Erklärung: Dieser Text ist prägnant, enthält Keywords (wenn auch nicht zwingend notwendig), bietet einen klaren Nutzen („Sichtbarkeit steigern“) und eine Handlungsaufforderung („kostenloses Erstgespräch“).
-""")
-
-    with st.expander("H1 (Hauptüberschrift)"):
-        st.write("""
+""",
+    "H1 (Hauptüberschrift)": """
 **Was es ist**  
 Die H1 ist die wichtigste Überschrift auf Ihrer Webseite selbst.  
 Sie sollte den Hauptinhalt der Seite zusammenfassen.
@@ -207,10 +108,8 @@ Pro Seite sollte es nur eine H1 geben.
 „Professionelle SEO Beratung für Kleinunternehmen in Hamburg“  
 → Erklärung: Diese H1 ist spezifisch, enthält das Fokus-Keyword und gibt dem Nutzer sofort einen klaren Überblick über das Thema der Seite.  
 Sie sollte das Haupt-Keyword der Seite enthalten.
-""")
-
-    with st.expander("Broken Link"):
-        st.write("""
+""",
+    "Broken Link": """
 **Was ist ein Broken Link**  
 Ein Broken Link (auch "toter Link" genannt) ist ein Link auf einer Webseite, der nicht mehr funktioniert. Wenn ein Nutzer oder eine Suchmaschine auf diesen Link klickt, landet er auf einer Fehlerseite, meistens einer "404-Seite" (die sogenannte „Fehlerseite“).
 
@@ -222,12 +121,11 @@ Broken Links sind aus zwei Hauptgründen problematisch:
 
 **Wie lassen sich „Broken Links“ in der Neukunden-Akquise nutzen?**  
 Wenn man bei der Analyse der Website eines potenziellen Kunden (viele) Broken Links findet, kann das als Einstieg in das Gespräch genutzt werden. Es kann aufgezeigt werden, dass die Website des Kunden nicht optimal gepflegt wird, was sich negativ auf das Ranking und die Kundenzufriedenheit auswirkt. Vorschlag: BERENDSOHN wartet / pflegt als Agentur die Website professionell und behebt solche Fehler, um die Online-Präsenz zu stärken.
-""")
-
-    st.subheader("Erklärungen möglicher Fehlermeldungen")
+""",
+}
 
-    with st.expander("Fehlercode UTF-8"):
-        st.write("""
+_ERROR_EXPLANATIONS = {
+    "Fehlercode UTF-8": """
 **Was ist UFT-8?**  
 UTF-8 ist wie eine Art „Sprachregelung“ für den Computer. Es ist eine Zeichencodierung, die sicherstellt, dass alle Zeichen – also Buchstaben, Zahlen, Satzzeichen, aber auch Sonderzeichen wie Ä, Ö, Ü und Emojis – auf der Webseite richtig angezeigt werden. Es ist der Standard, den moderne Websites verwenden.
 
@@ -240,10 +138,8 @@ Wenn eine Webseite eine alte oder falsche Codierung verwendet, können Suchmasch
 
 **Wie kann die veraltete Codierung in der Neukunden-Akquise genutzt werden?**  
 Es sollte erklärt werden, dass eine veraltete Codierung ein technisches Problem ist, das die Nutzererfahrung stört und die Auffindbarkeit bei Google beeinträchtigt. Vorschlag: BERENDSOHN bereinigt als Agentur diese technischen Grundlagen, um die Website professioneller zu gestalten und die SEO-Leistung zu verbessern.
-""")
-
-    with st.expander("Fehlercode SSL"):
-        st.write("""
+""",
+    "Fehlercode SSL": """
 **Was ist SSL-Verschlüsselung?**  
 Die SSL-Verschlüsselung ist wie ein digitaler Wachmann für die Webseite. Sie sorgt dafür, dass alle Daten, die zwischen der Website und dem Browser eines Nutzers ausgetauscht werden – also Passwörter, Kreditkarteninformationen oder Anfragen über ein Kontaktformular – absolut sicher sind und nicht von Dritten abgefangen werden können. Eine sichere Verbindung erkennt man am https:// in der Adresszeile und am kleinen Schloss-Symbol davor.
 
@@ -256,7 +152,218 @@ Wenn eine Website keine SSL-Verschlüsselung hat, passiert Folgendes:
 
 **Wie lässt sich das in der Neukunden-Akquise nutzen?**  
 Überprüfung, ob die Website eines potenziellen Kunden ein Schloss-Symbol in der Adresszeile hat. Wenn nicht, ist das der perfekte Einstieg ins Gespräch: Es sollte erklärt werden, dass die fehlende Verschlüsselung Kunden abschreckt und dem Google-Ranking schadet. Vorschlag, dass BERENDSOHN das SSL-Zertifikat für auf der Website installieren, um die Sicherheit zu gewährleisten und das Vertrauen von Kunden und Suchmaschinen zurückzugewinnen.
-""")
+""",
+}
+
+st.logo(
+    LOGO_URL_LARGE,
+    icon_image=LOGO_URL_SMALL,
+)
+
+today_str = datetime.date.today().strftime("%Y%m%d")
+
+st.set_page_config(page_title="SEO-Checker", layout="wide")
+st.title("SEO-Checker")
+st.text("Prüfe jetzt eine URL, um wertvolle Einblicke in die wichtigsten SEO-Metriken zu erhalten.")
+
+if "url_list" not in st.session_state:
+    st.session_state["url_list"] = []
+if "result_bytes" not in st.session_state:
+    st.session_state["result_bytes"] = None
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def cached_crawl_domain(url: str, max_pages: int):
+    return asyncio.run(crawl_domain(url, max_pages))
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def cached_load_sitemap(url: str):
+    return load_sitemap(url)
+
+def df_to_arrow_bytes(df) -> bytes:
+    """Ergebnis als Arrow-IPC-Puffer: kompakt im session_state, kein
+    pandas-Objektgraph, der bei jedem Rerun durchlaufen werden muss."""
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Rückfallebene für gemischte object-Spalten: alles als String
+        table = pa.Table.from_pandas(
+            df.where(df.notna(), "").astype(str), preserve_index=False
+        )
+    sink = pa.BufferOutputStream()
+    with ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+def arrow_bytes_to_df(buf: bytes):
+    # split_blocks=True legt jede Spalte als eigenen zusammenhängenden
+    # Block an (spaltenweises Layout); die Masken in build_row_styles und
+    # die Exporte arbeiten spaltenweise und profitieren davon
+    return ipc.open_stream(buf).read_all().to_pandas(
+        split_blocks=True, self_destruct=True
+    )
+
+tab_crawler, tab_manual, tab_sitemap = st.tabs(["Crawler", "Manuelle Eingabe", "Sitemap laden"])
+
+with tab_crawler:
+    crawl_url = st.text_input("Start-URL zum Crawlen", placeholder="https://example.com")
+    max_pages = st.slider("Max. Anzahl zu crawlender Seiten", 10, 500, 100)
+    if st.button("Domain crawlen"):
+        if crawl_url:
+            with st.spinner("Crawle interne Seiten …"):
+                st.session_state["url_list"] = cached_crawl_domain(crawl_url, max_pages)
+            st.success(f"{len(st.session_state['url_list'])} interne Seiten gefunden.")
+
+with tab_manual:
+    textarea = st.text_area("Eine URL pro Zeile")
+    if st.button("URLs übernehmen"):
+        urls = [u.strip() for u in textarea.splitlines() if u.strip()]
+        st.session_state["url_list"] = urls
+        st.success(f"{len(urls)} URLs übernommen.")
+
+with tab_sitemap:
+    sitemap_url = st.text_input("Sitemap-URL", placeholder="https://example.com/sitemap.xml")
+    if st.button("Sitemap laden"):
+        if sitemap_url:
+            with st.spinner("Sitemap wird geladen …"):
+                st.session_state["url_list"] = cached_load_sitemap(sitemap_url)
+            st.success(f"{len(st.session_state['url_list'])} URLs gefunden.")
+
+st.divider()
+
+if st.session_state["url_list"]:
+    if st.button("Analyse starten"):
+        # Round-robin über die Hosts gegen Head-of-line-Blocking
+        urls = interleave_by_host(st.session_state["url_list"])
+        # spaltenweise sammeln: ein DataFrame-Bau am Ende, keine
+        # Zwischenkopien über concat/append
+        cols = {f: [] for f in FIELDS}
+        progress_q: queue.Queue = queue.Queue()
+
+        def _on_result(row):
+            # läuft im Crawler-Thread, daher nur in die Queue melden.
+            # Fehlende Felder (Fehlerzeilen) als None, nicht "": sonst
+            # mischen numerische Spalten wie "Wörter" int und str und
+            # Arrow lehnt die Konvertierung ab
+            for f in FIELDS:
+                cols[f].append(row.get(f))
+            progress_q.put(len(cols["URL"]))
+
+        # Crawl in einem Hintergrund-Thread; der Script-Thread bleibt frei,
+        # um Fortschritt in st.status zu zeichnen
+        with st.status("Analyse läuft …", expanded=True) as status:
+            progress = st.progress(0, "Starte Analyse …")
+            with ThreadPoolExecutor(max_workers=1) as pool:
+                fut = pool.submit(asyncio.run, crawl(urls, on_result=_on_result))
+                done = 0
+                while not fut.done():
+                    try:
+                        while True:
+                            done = progress_q.get(timeout=0.1)
+                            if progress_q.empty():
+                                break
+                    except queue.Empty:
+                        pass
+                    if done:
+                        progress.progress(done / len(urls), text=f"Analysiere {done}/{len(urls)}")
+                fut.result()  # Fehler aus dem Crawl hier sichtbar machen
+            status.update(label="Analyse abgeschlossen", state="complete", expanded=False)
+
+        st.session_state["result_bytes"] = df_to_arrow_bytes(pd.DataFrame(cols, copy=False))
+
+@st.cache_data(show_spinner=False)
+def to_csv_bytes(df) -> bytes:
+    # Arrow serialisiert direkt nach UTF-8-Bytes, ohne den CSV-String
+    # erst als Python-str aufzubauen
+    try:
+        sink = io.BytesIO()
+        pacsv.write_csv(pa.Table.from_pandas(df, preserve_index=False), sink)
+        return sink.getvalue()
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return df.to_csv(index=False).encode()
+
+@st.cache_data(show_spinner=False)
+def to_xlsx_bytes(df) -> bytes:
+    excel_buffer = io.BytesIO()
+    # constant_memory hält nur die aktuelle Zeile im Speicher, verlangt dafür
+    # aber striktes Schreiben in Zeilenreihenfolge. pandas' to_excel schreibt
+    # spaltenweise, deshalb gehen die Zeilen hier direkt über xlsxwriter raus.
+    workbook = xlsxwriter.Workbook(excel_buffer, {
+        "constant_memory": True,
+        "strings_to_urls": False,
+        "use_zip64": True,  # sehr große Sheets sauber schreiben
+    })
+    worksheet = workbook.add_worksheet("SEO Ergebnisse")
+    worksheet.write_row(0, 0, [str(c) for c in df.columns])
+    for r, row in enumerate(df.itertuples(index=False, name=None), start=1):
+        worksheet.write_row(r, 0, ["" if pd.isna(v) else v for v in row])
+    workbook.close()
+    return excel_buffer.getvalue()
+
+def build_row_styles(df):
+    """Vektorisierte CSS-Matrix statt einem Python-Call pro Zeile."""
+    styles = pd.DataFrame("", index=df.index, columns=df.columns)
+    err_mask = pd.Series(False, index=df.index)
+    if "HTTP Status" in df.columns:
+        err_mask = df["HTTP Status"].astype(str).str.startswith(("4", "5"))
+    warn_mask = pd.Series(False, index=df.index)
+    if "Status" in df.columns:
+        warn_mask = df["Status"].astype(str).str.lower().str.contains("noindex")
+    if "Robots Policy" in df.columns:
+        warn_mask = warn_mask | df["Robots Policy"].eq("Disallowed")
+    styles.loc[err_mask, :] = "background-color: #f8d7da"
+    styles.loc[warn_mask & ~err_mask, :] = "background-color: #fff4cd"
+    return styles
+
+if st.session_state["result_bytes"] is not None:
+    df = arrow_bytes_to_df(st.session_state["result_bytes"])
+    df = df.drop(columns=[c for c in ("Hinweis",) if c in df.columns])
+    # Status-artige Spalten haben nur eine Handvoll Ausprägungen:
+    # Categorical statt object spart Speicher und Styler-Arbeit
+    df = df.astype({
+        c: "category"
+        for c in ("Status", "Robots Policy", "CMS", "HTTP Status")
+        if c in df.columns
+    })
+
+    # Ab ~2000 Zeilen dominiert das Inline-CSS des Stylers die Renderzeit,
+    # dann lieber ungefärbt anzeigen
+    if len(df) > 2000:
+        st.dataframe(df, use_container_width=True)
+    else:
+        try:
+            styled = df.style.apply(lambda _: build_row_styles(df), axis=None)
+            st.dataframe(styled, use_container_width=True)
+        except AttributeError:
+            st.dataframe(df, use_container_width=True)
+
+    # CSV Export (gecacht: Reruns durch Widget-Klicks serialisieren nicht neu)
+    st.download_button(
+        label="CSV herunterladen",
+        data=to_csv_bytes(df),
+        file_name=f"seo_checker_results_{today_str}.csv",
+        mime="text/csv"
+    )
+
+    # Excel Export
+    st.download_button(
+        label="Excel herunterladen",
+        data=to_xlsx_bytes(df),
+        file_name=f"seo_checker_results_{today_str}.xlsx",
+        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    )
+
+    st.markdown("---")
+    st.subheader("Erklärungen der SEO-Metriken")
+
+    for _title, _body in _EXPLANATIONS.items():
+        with st.expander(_title):
+            st.markdown(_body)
+
+    st.subheader("Erklärungen möglicher Fehlermeldungen")
+
+    for _title, _body in _ERROR_EXPLANATIONS.items():
+        with st.expander(_title):
+            st.markdown(_body)
 
 else:
     st.info("Bitte URLs laden und anschließend auf »Analyse starten« klicken.")
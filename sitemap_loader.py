@@ -1,9 +1,9 @@
 #!/usr/bin/env python3
 """Sitemap-Loader mit robustem Error‑Handling & HTML‑Filter"""
 
-import requests, gzip, urllib.parse, time
-from bs4 import BeautifulSoup
-from typing import List
+import aiohttp, asyncio, random, re, zlib
+from lxml import etree
+from typing import Iterable, List, Tuple
 
 NON_HTML_EXT = {
     ".jpg", ".jpeg", ".png", ".gif", ".webp", ".svg",
@@ -16,40 +16,142 @@ HEADERS = {
     "User-Agent": "NoIndexCheckerBot/1.0 (+https://example.com/bot-info)"
 }
 
+TIMEOUT = aiohttp.ClientTimeout(total=15)
+MAX_DEPTH = 2  # sitemapindex darf auf sitemapindex zeigen, aber nicht tiefer
+_CHUNK = 64 * 1024  # Fenstergröße für entpacktes Parsen
+
+# Ein kompiliertes Muster über alle Nicht-HTML-Endungen statt
+# urlparse + lower + rsplit + Set-Lookup pro URL
+_NON_HTML_RE = re.compile(
+    r"\.(?:" + "|".join(sorted(e.lstrip(".") for e in NON_HTML_EXT)) + r")(?:[?#]|$)",
+    re.I,
+)
+
 def is_html_url(url: str) -> bool:
-    path = urllib.parse.urlparse(url).path.lower()
-    if not path or path.endswith(("/", "#")):
-        return True  # wahrscheinlich HTML-Dokument ohne Endung
-    ext = "." + path.rsplit(".", 1)[-1] if "." in path else ""
-    return ext in {"", ".html", ".htm", ".php", ".asp", ".aspx"}
-
-def _fetch_url(url: str, retries: int = 3, backoff: float = 1.5) -> bytes:
-    """Lädt URL mit Retry bei ConnectionReset/Timeout."""
+    return _NON_HTML_RE.search(url) is None
+
+async def _fetch_url(session: aiohttp.ClientSession, url: str,
+                     retries: int = 3, backoff: float = 1.5) -> bytes:
+    """Lädt URL mit Retry bei ConnectionReset/Timeout/429/503."""
     for attempt in range(retries):
         try:
-            resp = requests.get(url, timeout=15, headers=HEADERS, stream=True)
-            resp.raise_for_status()
-            return resp.content
-        except (requests.exceptions.ConnectionError,
-                requests.exceptions.Timeout) as e:
+            async with session.get(url, timeout=TIMEOUT) as resp:
+                # 429/503 sind transient und einen Retry wert
+                resp.raise_for_status()
+                return await resp.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            status = getattr(e, "status", None)
+            if status is not None and status not in (429, 503):
+                raise e  # echter HTTP-Fehler, Retry bringt nichts
             if attempt < retries - 1:
-                time.sleep(backoff * (attempt + 1))
+                # exponentiell mit Jitter, damit parallele Fetcher ihre
+                # Retries nicht synchron auf den Server klatschen
+                delay = backoff * (2 ** attempt) + random.uniform(0, 0.5 * 2 ** attempt)
+                await asyncio.sleep(delay)
                 continue
             raise e  # nach max Retries Fehler weitergeben
 
-def load_sitemap(url: str) -> List[str]:
-    """Gibt reine HTML‑Links aus Sitemap zurück. Fehlertolerant."""
+def _parse_sitemap(chunks: Iterable[bytes]) -> Tuple[List[str], bool]:
+    """Sammelt alle <loc>-Texte aus Byte-Häppchen ein und meldet, ob die
+    Wurzel ein <sitemapindex> ist. Pull-Parser statt DOM: Elemente werden
+    sofort wieder freigegeben, Speicher bleibt unabhängig von der
+    Sitemap-Größe."""
+    parser = etree.XMLPullParser(events=("start", "end"), recover=True, huge_tree=True)
+    urls: List[str] = []
+    is_index = False
+    root_seen = False
+    for chunk in chunks:
+        if not chunk:
+            continue
+        parser.feed(chunk)
+        for event, elem in parser.read_events():
+            tag = elem.tag.split("}")[-1] if isinstance(elem.tag, str) else ""
+            if event == "start":
+                if not root_seen:
+                    is_index = tag == "sitemapindex"
+                    root_seen = True
+                continue
+            if tag == "loc" and elem.text:
+                urls.append(elem.text.strip())
+            elem.clear()
+    return urls, is_index
+
+def _parse_sitemap_fallback(content: bytes) -> Tuple[List[str], bool]:
+    """Zweiter Versuch für schwer kaputte Feeds: kompletter recover-Parse
+    über libxml2 plus local-name()-XPath, Namespace-Müll egal."""
     try:
-        raw = _fetch_url(url)
-    except Exception as e:
-        print(f"Fehler beim Abrufen der Sitemap: {e}")
-        return []
-
-    content = gzip.decompress(raw) if url.endswith(".gz") else raw
-    soup = BeautifulSoup(content, "xml")
-    urls = [loc.text.strip() for loc in soup.find_all("loc")]
+        root = etree.fromstring(
+            content, parser=etree.XMLParser(recover=True, huge_tree=True)
+        )
+    except etree.XMLSyntaxError:
+        return [], False
+    if root is None:
+        return [], False
+    is_index = isinstance(root.tag, str) and root.tag.split("}")[-1] == "sitemapindex"
+    locs = [t.strip() for t in root.xpath("//*[local-name()='loc']/text()") if t.strip()]
+    return locs, is_index
+
+async def _load(url: str, session: aiohttp.ClientSession,
+                sem: asyncio.Semaphore, depth: int = 0) -> List[str]:
+    async with sem:
+        try:
+            raw = await _fetch_url(session, url)
+        except Exception as e:
+            print(f"Fehler beim Abrufen der Sitemap: {e}")
+            return []
+
+    if raw[:2] == b"\x1f\x8b":
+        # gzip an den Magic Bytes erkennen statt an der URL-Endung: trifft
+        # auch .xml, das der Server gepackt ausliefert, und entpackt nichts
+        # doppelt, was aiohttp (Content-Encoding) schon dekodiert hat.
+        # Fensterweise entpacken und direkt in den Parser füttern, statt
+        # das komplette Dekomprimat neben dem Rohpuffer zu materialisieren
+        decomp = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        locs, is_index = _parse_sitemap(
+            decomp.decompress(raw[i:i + _CHUNK]) for i in range(0, len(raw), _CHUNK)
+        )
+    else:
+        locs, is_index = _parse_sitemap((raw,))
+
+    if not locs and raw:
+        # Streaming-Parser hat nichts gefunden: einmal brute-force nachfassen
+        if raw[:2] == b"\x1f\x8b":
+            try:
+                content = zlib.decompress(raw, 16 + zlib.MAX_WBITS)
+            except zlib.error:
+                content = b""
+        else:
+            content = raw
+        locs, is_index = _parse_sitemap_fallback(content)
+
+    if is_index and depth < MAX_DEPTH:
+        # Kind-Sitemaps parallel laden, Semaphore begrenzt die Gleichzeitigkeit
+        children = await asyncio.gather(
+            *[_load(child, session, sem, depth + 1) for child in locs]
+        )
+        return [u for sub in children for u in sub]
+    return locs
+
+def load_sitemap(url: str) -> List[str]:
+    """Gibt reine HTML‑Links aus Sitemap zurück, folgt Sitemap-Indexen.
+    Fehlertolerant."""
+    async def _run() -> List[str]:
+        sem = asyncio.Semaphore(8)
+        # Ein Pool für Index + alle Kind-Sitemaps: TLS/TCP-Handshake fällt
+        # pro Host nur einmal an
+        conn = aiohttp.TCPConnector(
+            limit=8,
+            limit_per_host=8,
+            ttl_dns_cache=300,
+            keepalive_timeout=30,
+            enable_cleanup_closed=True,
+        )
+        async with aiohttp.ClientSession(headers=HEADERS, connector=conn) as session:
+            return await _load(url, session, sem)
+
+    urls = asyncio.run(_run())
     return [u for u in urls if is_html_url(u)]
 
 if __name__ == "__main__":
     import sys, json
-    print(json.dumps(load_sitemap(sys.argv[1]), indent=2))
\ No newline at end of file
+    print(json.dumps(load_sitemap(sys.argv[1]), indent=2))